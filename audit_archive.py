@@ -0,0 +1,181 @@
+import json
+import os
+import sqlite3
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+
+from models import db, AuditLog, AuditArchive, User
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_log_archive (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    action VARCHAR(50) NOT NULL,
+    table_name VARCHAR(50) NOT NULL,
+    record_id INTEGER,
+    changes_summary TEXT,
+    ip_address VARCHAR(45),
+    timestamp DATETIME NOT NULL,
+    payload BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_archive_timestamp ON audit_log_archive (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_archive_record ON audit_log_archive (table_name, record_id);
+"""
+
+
+def archive_file_name(month):
+    return f"audit_{month.replace('-', '_')}.db"
+
+
+def _next_month(month_start):
+    if month_start.month == 12:
+        return month_start.replace(year=month_start.year + 1, month=1)
+    return month_start.replace(month=month_start.month + 1)
+
+
+def _compress_payload(log):
+    """Pack the bulky text columns into one zlib-compressed blob"""
+    payload = {
+        'old_values': log.old_values,
+        'new_values': log.new_values,
+        'user_agent': log.user_agent
+    }
+    return zlib.compress(json.dumps(payload).encode('utf-8'))
+
+
+def _decompress_payload(blob):
+    if not blob:
+        return {}
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def archive_audit_logs(archive_dir, cutoff, chunk_size=1000):
+    """Move audit rows older than cutoff into monthly archive databases.
+
+    Each month's rows go to their own SQLite file in archive_dir. The old
+    and new values and the user agent are stored as a compressed blob. The
+    archive file is committed before rows are deleted from the main
+    database, and re-archiving a row replaces it, so an interrupted run can
+    simply be repeated.
+
+    Returns {month: rows_archived}.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = {}
+
+    oldest = db.session.query(db.func.min(AuditLog.timestamp)).filter(AuditLog.timestamp < cutoff).scalar()
+    if oldest is None:
+        return archived
+
+    month_start = datetime(oldest.year, oldest.month, 1)
+    while month_start < cutoff:
+        month_end = _next_month(month_start)
+        window_end = min(month_end, cutoff)
+        month = month_start.strftime('%Y-%m')
+        month_start = month_end
+        if not AuditLog.query.filter(AuditLog.timestamp >= datetime.strptime(month, '%Y-%m'),
+                                     AuditLog.timestamp < window_end).first():
+            continue
+
+        file_name = archive_file_name(month)
+        connection = sqlite3.connect(os.path.join(archive_dir, file_name))
+        try:
+            connection.executescript(ARCHIVE_SCHEMA)
+            moved = 0
+            last_id = 0
+
+            while True:
+                logs = AuditLog.query.filter(
+                    AuditLog.timestamp >= datetime.strptime(month, '%Y-%m'),
+                    AuditLog.timestamp < window_end,
+                    AuditLog.id > last_id
+                ).order_by(AuditLog.id).limit(chunk_size).all()
+                if not logs:
+                    break
+
+                connection.executemany(
+                    'INSERT OR REPLACE INTO audit_log_archive (id, user_id, action, table_name, record_id, '
+                    'changes_summary, ip_address, timestamp, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(log.id, log.user_id, log.action, log.table_name, log.record_id, log.changes_summary,
+                      log.ip_address, log.timestamp.isoformat(sep=' '), _compress_payload(log)) for log in logs]
+                )
+                connection.commit()
+
+                ids = [log.id for log in logs]
+                db.session.execute(
+                    db.delete(AuditLog).where(AuditLog.id.in_(ids)).execution_options(synchronize_session=False)
+                )
+                for log in logs:
+                    db.session.expunge(log)
+
+                last_id = ids[-1]
+                moved += len(ids)
+
+            row_count = connection.execute('SELECT COUNT(*) FROM audit_log_archive').fetchone()[0]
+            archive_min, archive_max = connection.execute(
+                'SELECT MIN(id), MAX(id) FROM audit_log_archive'
+            ).fetchone()
+        finally:
+            connection.close()
+
+        entry = AuditArchive.query.filter_by(month=month).first()
+        if not entry:
+            entry = AuditArchive(month=month, file_name=file_name)
+            db.session.add(entry)
+        entry.min_id = archive_min
+        entry.max_id = archive_max
+        entry.row_count = row_count
+        entry.archived_at = datetime.utcnow()
+        db.session.commit()
+
+        archived[month] = moved
+
+    return archived
+
+
+def load_archived_audit_log(archive_dir, log_id):
+    """Look up an archived audit entry by id.
+
+    Returns an object shaped like an AuditLog row, with user loaded and
+    archived=True, or None when no archive holds that id.
+    """
+    candidates = AuditArchive.query.filter(
+        AuditArchive.min_id <= log_id,
+        AuditArchive.max_id >= log_id
+    ).order_by(AuditArchive.month).all()
+
+    for entry in candidates:
+        path = os.path.join(archive_dir, entry.file_name)
+        if not os.path.exists(path):
+            continue
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            row = connection.execute(
+                'SELECT id, user_id, action, table_name, record_id, changes_summary, ip_address, timestamp, payload '
+                'FROM audit_log_archive WHERE id = ?', (log_id,)
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            continue
+
+        payload = _decompress_payload(row[8])
+        return SimpleNamespace(
+            id=row[0],
+            user_id=row[1],
+            user=db.session.get(User, row[1]),
+            action=row[2],
+            table_name=row[3],
+            record_id=row[4],
+            changes_summary=row[5],
+            ip_address=row[6],
+            timestamp=datetime.fromisoformat(row[7]),
+            old_values=payload.get('old_values'),
+            new_values=payload.get('new_values'),
+            user_agent=payload.get('user_agent'),
+            archived=True,
+            archive_month=entry.month
+        )
+
+    return None
@@ -0,0 +1,264 @@
+import atexit
+import json
+import queue
+import threading
+import time
+from collections.abc import Mapping
+
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db, AuditLog
+
+
+class AuditSnapshot(Mapping):
+    """Column values of a model instance, taken for an audit event.
+
+    Taking a snapshot only copies the instance's column values, so the
+    request does not pay for to_dict() and the relationship loads it
+    triggers. The audit writer rebuilds the instance from the snapshot
+    and calls to_dict() when it writes the row. The snapshot itself reads
+    like a dict of the column values, which is enough for
+    get_changes_summary.
+    """
+
+    excluded_columns = frozenset({'password_hash'})
+
+    def __init__(self, instance):
+        mapper = inspect(instance).mapper
+        self.model = mapper.class_
+        self.values = {
+            attr.key: getattr(instance, attr.key)
+            for attr in mapper.column_attrs if attr.key not in self.excluded_columns
+        }
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def to_dict(self, session):
+        """The instance's to_dict() as of the snapshot; related objects are
+        loaded through session as they are now. Falls back to the column
+        values when the instance cannot be rebuilt."""
+        instance = self.model.__mapper__.class_manager.new_instance()
+        for key, value in self.values.items():
+            set_committed_value(instance, key, value)
+        try:
+            make_transient_to_detached(instance)
+            session.add(instance)
+            return instance.to_dict()
+        except Exception:
+            return dict(self.values)
+        finally:
+            session.expunge_all()
+
+
+class AuditWriter:
+    """Writes audit log rows outside the business transaction.
+
+    In ``async`` mode, events are held on the SQLAlchemy session until it
+    commits, then handed to a bounded queue. A background thread serialises
+    them and bulk-inserts them in batches. Events from rolled-back
+    transactions are dropped. When the queue is full the batch is written
+    inline instead of being lost. Anything still queued is flushed at
+    interpreter exit.
+
+    In ``sync`` mode every event is added to the current session as an
+    AuditLog row, so it commits or rolls back with the business data.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.mode = 'sync'
+        self.batch_size = 100
+        self.flush_interval = 1.0
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.written_inline = 0
+        self.failed = 0
+        self._written_listeners = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.mode = app.config.get('AUDIT_LOG_MODE', 'async')
+        self.batch_size = app.config.get('AUDIT_LOG_BATCH_SIZE', 100)
+        self.flush_interval = app.config.get('AUDIT_LOG_FLUSH_INTERVAL', 1.0)
+        self._queue = queue.Queue(maxsize=app.config.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+
+        event.listen(db.session, 'after_commit', self._on_commit)
+        event.listen(db.session, 'after_soft_rollback', self._on_rollback)
+        atexit.register(self.shutdown)
+
+    def record(self, **audit_event):
+        """Record one audit event for the current transaction"""
+        if self.mode == 'sync':
+            # Join the request's transaction, so rows it has not committed can be read
+            with Session(bind=db.session.connection()) as session:
+                row = self._to_row(audit_event, session)
+            db.session.add(AuditLog(**row))
+            db.session.info.setdefault('audit_rows_added', []).append(audit_event)
+        else:
+            db.session.info.setdefault('audit_events', []).append(audit_event)
+
+    def on_written(self, listener):
+        """Call listener(events) once audit events are committed to the audit log"""
+        self._written_listeners.append(listener)
+        return listener
+
+    def _notify_written(self, events):
+        for listener in self._written_listeners:
+            try:
+                listener(events)
+            except Exception as e:
+                self.app.logger.error(f"Error in audit write listener: {str(e)}")
+
+    def _on_commit(self, session):
+        added = session.info.pop('audit_rows_added', None)
+        if added:
+            self._notify_written(added)
+
+        events = session.info.pop('audit_events', None)
+        if not events:
+            return
+        self._ensure_worker()
+        for index, audit_event in enumerate(events):
+            try:
+                self._queue.put_nowait(audit_event)
+                self.enqueued += 1
+            except queue.Full:
+                self.app.logger.warning("Audit queue is full, writing audit events inline")
+                self._write_batch(events[index:])
+                self.written_inline += len(events) - index
+                break
+
+    def _on_rollback(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop('audit_events', None)
+            session.info.pop('audit_rows_added', None)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
+
+            batch = [first]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    audit_event = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if audit_event is None:
+                    stop = True
+                    break
+                batch.append(audit_event)
+
+            self._write_batch(batch)
+            if stop:
+                break
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                audit_event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if audit_event is not None:
+                batch.append(audit_event)
+        return batch
+
+    def flush(self):
+        """Write everything currently queued from the calling thread"""
+        if self._queue is None:
+            return 0
+        batch = self._drain()
+        for start in range(0, len(batch), self.batch_size):
+            self._write_batch(batch[start:start + self.batch_size])
+        return len(batch)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the worker and flush whatever it has not written yet"""
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+        self.flush()
+
+    @staticmethod
+    def _expand(values, session):
+        if isinstance(values, AuditSnapshot):
+            return values.to_dict(session)
+        return values
+
+    def _to_row(self, audit_event, session):
+        old_values = self._expand(audit_event.get('old_values'), session)
+        new_values = self._expand(audit_event.get('new_values'), session)
+        return {
+            'user_id': audit_event['user_id'],
+            'action': audit_event['action'],
+            'table_name': audit_event['table_name'],
+            'record_id': audit_event.get('record_id'),
+            'old_values': json.dumps(old_values, default=str) if old_values else None,
+            'new_values': json.dumps(new_values, default=str) if new_values else None,
+            'changes_summary': audit_event.get('changes_summary'),
+            'ip_address': audit_event.get('ip_address'),
+            'user_agent': audit_event.get('user_agent'),
+            'timestamp': audit_event['timestamp']
+        }
+
+    def _write_batch(self, batch, retries=5):
+        with self.app.app_context():
+            with Session(db.engine) as session:
+                rows = [self._to_row(audit_event, session) for audit_event in batch]
+            for attempt in range(retries + 1):
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(AuditLog.__table__.insert(), rows)
+                    self.written += len(rows)
+                    self._notify_written(batch)
+                    return
+                except OperationalError as e:
+                    if 'locked' not in str(e).lower() or attempt == retries:
+                        self.failed += len(rows)
+                        self.app.logger.error(f"Error writing {len(rows)} audit log entries: {str(e)}")
+                        return
+                    time.sleep(0.05 * (2 ** attempt))
+                except Exception as e:
+                    self.failed += len(rows)
+                    self.app.logger.error(f"Error writing {len(rows)} audit log entries: {str(e)}")
+                    return
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'written_inline': self.written_inline,
+            'failed': self.failed
+        }
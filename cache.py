@@ -0,0 +1,115 @@
+import pickle
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # redis is optional; fall back to the in-process store
+    redis = None
+
+
+class SnapshotCache:
+    """Small TTL cache for computed snapshots (valuations, dashboards, ...).
+
+    Values live in a process-local dict by default. When a redis URL is
+    given and the redis package is installed, values are pickled into
+    redis instead so every worker shares the same snapshot. Hit and miss
+    counters are always kept per process.
+    """
+
+    def __init__(self, name, default_ttl=300, redis_url=None):
+        self.name = name
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._store = {}
+        self._redis = redis.Redis.from_url(redis_url) if (redis_url and redis is not None) else None
+
+    @property
+    def backend(self):
+        return 'redis' if self._redis is not None else 'memory'
+
+    def _redis_key(self, key):
+        return f"{self.name}:{key}"
+
+    def get(self, key):
+        """Return the cached value for key, or None when missing or expired"""
+        value = None
+        if self._redis is not None:
+            raw = self._redis.get(self._redis_key(key))
+            if raw is not None:
+                value = pickle.loads(raw)
+        else:
+            with self._lock:
+                entry = self._store.get(key)
+                if entry is not None:
+                    expires_at, cached = entry
+                    if expires_at > time.monotonic():
+                        value = cached
+                    else:
+                        del self._store[key]
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def peek(self, key):
+        """Like get(), but without touching the hit and miss counters"""
+        if self._redis is not None:
+            raw = self._redis.get(self._redis_key(key))
+            return pickle.loads(raw) if raw is not None else None
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+        return None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.default_ttl
+        if self._redis is not None:
+            self._redis.setex(self._redis_key(key), ttl, pickle.dumps(value))
+        else:
+            with self._lock:
+                self._store[key] = (time.monotonic() + ttl, value)
+
+    def get_or_compute(self, key, compute, ttl=None):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or every key of this cache when key is None"""
+        if self._redis is not None:
+            if key is not None:
+                self._redis.delete(self._redis_key(key))
+            else:
+                keys = list(self._redis.scan_iter(match=self._redis_key('*')))
+                if keys:
+                    self._redis.delete(*keys)
+        with self._lock:
+            if key is not None:
+                self._store.pop(key, None)
+            else:
+                self._store.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'backend': self.backend,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups * 100) if lookups else 0,
+                'invalidations': self.invalidations,
+                'entries': len(self._store) if self._redis is None else None
+            }
@@ -0,0 +1,135 @@
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+
+# Defaults for the SQLite profile; each can be overridden in app.config
+SQLITE_DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    'SQLITE_CACHE_SIZE_KB': 64 * 1024,
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'SQLITE_TEMP_STORE': 'MEMORY',
+    'SQLITE_POOL_SIZE': 10,
+}
+
+# Pool sizing for server databases (PostgreSQL, MySQL); per worker process
+SERVER_DEFAULTS = {
+    'DB_POOL_SIZE': 10,
+    'DB_MAX_OVERFLOW': 20,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,
+}
+
+
+def database_uri_from_env(default):
+    """Database URI from DATABASE_URL, accepting the legacy postgres:// scheme"""
+    uri = os.environ.get('DATABASE_URL') or default
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def is_sqlite_uri(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def sqlite_engine_options(uri, config):
+    """Engine options for a SQLite database.
+
+    pool_pre_ping and pool_recycle guard against dropped server
+    connections, which SQLite does not have. File databases get a
+    QueuePool of long-lived connections so the per-connection page cache
+    and mmap survive between requests. In-memory databases must share one
+    connection, so they get a StaticPool.
+    """
+    database = make_url(uri).database
+    if not database or database == ':memory:':
+        return {
+            'poolclass': StaticPool,
+            'connect_args': {'check_same_thread': False},
+        }
+    return {
+        'poolclass': QueuePool,
+        'pool_size': config['SQLITE_POOL_SIZE'],
+        'max_overflow': config['SQLITE_POOL_SIZE'],
+        'connect_args': {
+            'check_same_thread': False,
+            'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+        },
+    }
+
+
+def server_engine_options(config):
+    """Engine options for a server database: a sized, health-checked pool"""
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def sqlite_pragmas(config):
+    return [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA cache_size=-{int(config['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA temp_store={config['SQLITE_TEMP_STORE']}",
+    ]
+
+
+def attach_sqlite_pragmas(engine, config):
+    """Run the profile's pragmas on every new connection of a SQLite engine.
+
+    Call once per engine after db.init_app(app); other engines in the
+    process are left alone. Engines for other databases are skipped.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config)
+
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                try:
+                    cursor.execute(pragma)
+                except sqlite3.OperationalError:
+                    # Read-only connections (e.g. a replica snapshot) cannot
+                    # change the journal mode; the other pragmas still apply
+                    if not pragma.startswith('PRAGMA journal_mode'):
+                        raise
+        finally:
+            cursor.close()
+
+    event.listen(engine, 'connect', apply_pragmas)
+
+
+def apply_engine_profile(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+
+    Must run before db.init_app(app); the SQLite pragmas are attached to
+    the created engines with attach_sqlite_pragmas(). Options already set
+    in SQLALCHEMY_ENGINE_OPTIONS take precedence over the profile.
+    """
+    for defaults in (SQLITE_DEFAULTS, SERVER_DEFAULTS):
+        for key, value in defaults.items():
+            app.config.setdefault(key, value)
+
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if is_sqlite_uri(uri):
+        profile = sqlite_engine_options(uri, app.config)
+    else:
+        profile = server_engine_options(app.config)
+
+    profile.update(options)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = profile
+    return profile
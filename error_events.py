@@ -0,0 +1,115 @@
+import atexit
+import threading
+import time
+
+
+class ErrorEventAggregator:
+    """Counts error responses in memory and logs one summary per window.
+
+    Each hit only bumps a counter keyed by (status, path), so a crawler or
+    a misbehaving client costs a dict update instead of a database write.
+    Every ``window`` seconds the counters are flushed to the application
+    logger, busiest paths first. At most ``max_paths`` distinct paths are
+    tracked per window; anything beyond that is counted under one overflow
+    bucket.
+    """
+
+    OVERFLOW_PATH = '<other>'
+
+    def __init__(self, app=None):
+        self.app = None
+        self.window = 60
+        self.max_paths = 500
+        self.max_log_lines = 20
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._window_started = time.monotonic()
+        self._thread = None
+        self._stop = threading.Event()
+        self.total_events = 0
+        self.flushes = 0
+        self.last_summary = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.window = app.config.get('ERROR_EVENT_WINDOW', 60)
+        self.max_paths = app.config.get('ERROR_EVENT_MAX_PATHS', 500)
+        self.max_log_lines = app.config.get('ERROR_EVENT_MAX_LOG_LINES', 20)
+        atexit.register(self.shutdown)
+
+    def record(self, status, path, user_id=None):
+        """Count one error response"""
+        now = time.monotonic()
+        with self._lock:
+            key = (status, path)
+            if key not in self._counts and len(self._counts) >= self.max_paths:
+                key = (status, self.OVERFLOW_PATH)
+            entry = self._counts.get(key)
+            if entry is None:
+                entry = self._counts[key] = {'count': 0, 'users': set(), 'first_seen': now, 'last_seen': now}
+            entry['count'] += 1
+            entry['last_seen'] = now
+            if user_id is not None:
+                entry['users'].add(user_id)
+            self.total_events += 1
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='error-event-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.window):
+            self.flush()
+
+    def flush(self):
+        """Log and reset the current window's counters; returns the summary"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            started, self._window_started = self._window_started, time.monotonic()
+        if not counts:
+            return []
+
+        elapsed = time.monotonic() - started
+        summary = sorted(
+            ({'status': status, 'path': path, 'count': entry['count'], 'users': len(entry['users'])}
+             for (status, path), entry in counts.items()),
+            key=lambda item: item['count'],
+            reverse=True
+        )
+        total = sum(item['count'] for item in summary)
+
+        logger = self.app.logger
+        logger.warning(f"{total} error responses across {len(summary)} paths in the last {elapsed:.0f}s")
+        for item in summary[:self.max_log_lines]:
+            logger.warning(f"  {item['status']} {item['path']}: {item['count']} hits from {item['users']} users")
+        if len(summary) > self.max_log_lines:
+            logger.warning(f"  ... and {len(summary) - self.max_log_lines} more paths")
+
+        self.flushes += 1
+        self.last_summary = summary[:self.max_log_lines]
+        return summary
+
+    def shutdown(self):
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = sum(entry['count'] for entry in self._counts.values())
+            tracked_paths = len(self._counts)
+        return {
+            'window_seconds': self.window,
+            'total_events': self.total_events,
+            'pending_events': pending,
+            'tracked_paths': tracked_paths,
+            'flushes': self.flushes,
+            'last_summary': self.last_summary
+        }
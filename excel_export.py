@@ -0,0 +1,125 @@
+from itertools import chain, islice
+from tempfile import SpooledTemporaryFile
+
+import openpyxl
+from flask import Response
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Rows looked at to size the columns, kept in memory until the sheet is written
+WIDTH_SAMPLE_ROWS = 200
+# Finished workbooks stay in memory up to this size, then spill to a temp file
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+MAX_COLUMN_WIDTH = 50
+
+
+class StreamingWorkbook:
+    """Excel workbook written row by row in openpyxl's write-only mode.
+
+    Rows are never held as cells: each sheet is written straight through
+    to openpyxl's temporary sheet files. Write-only sheets need their
+    column widths before the first row, so the widths are estimated from
+    the first sample_rows rows. The finished file is saved to a spooled
+    temporary file and streamed to the client in chunks.
+    """
+
+    header_font = Font(color='FFFFFF', bold=True)
+    header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+    title_font = Font(size=16, bold=True)
+
+    def __init__(self, sample_rows=WIDTH_SAMPLE_ROWS, spool_max_bytes=SPOOL_MAX_BYTES):
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sample_rows = sample_rows
+        self.spool_max_bytes = spool_max_bytes
+        self.row_counts = {}
+
+    def add_sheet(self, name, rows, headers=None, title=None):
+        """Write a sheet from an iterable of row sequences.
+
+        With title, the first row is a merged, bold title followed by a
+        blank row. With headers, a styled header row comes before the data.
+        Returns the number of data rows written.
+        """
+        ws = self.workbook.create_sheet(name[:31])  # Excel sheet name limit
+
+        rows = iter(rows)
+        sample = [list(row) for row in islice(rows, self.sample_rows)]
+        widths = self._column_widths(headers, sample)
+        for index, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+
+        if title:
+            title_cell = WriteOnlyCell(ws, value=title)
+            title_cell.font = self.title_font
+            title_cell.alignment = Alignment(horizontal='center')
+            ws.append([title_cell])
+            ws.append([])
+            if len(widths) > 1:
+                ws.merged_cells.add(f'A1:{get_column_letter(len(widths))}1')
+
+        if headers:
+            header_cells = []
+            for header in headers:
+                cell = WriteOnlyCell(ws, value=header)
+                cell.font = self.header_font
+                cell.fill = self.header_fill
+                cell.alignment = Alignment(horizontal='center')
+                header_cells.append(cell)
+            ws.append(header_cells)
+
+        count = 0
+        for row in chain(sample, rows):
+            ws.append(list(row))
+            count += 1
+
+        self.row_counts[ws.title] = count
+        return count
+
+    @staticmethod
+    def _column_widths(headers, sample):
+        widths = [len(str(header)) for header in headers or []]
+        for row in sample:
+            for index, value in enumerate(row):
+                length = len(str(value)) if value is not None else 0
+                if index < len(widths):
+                    widths[index] = max(widths[index], length)
+                else:
+                    widths.append(length)
+        return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+
+    def write_to(self, output):
+        """Write the finished workbook to a binary file object"""
+        self.workbook.save(output)
+
+    def save(self):
+        """Save to a spooled temporary file, rewound to the start"""
+        output = SpooledTemporaryFile(max_size=self.spool_max_bytes)
+        self.write_to(output)
+        output.seek(0)
+        return output
+
+    def response(self, filename):
+        """Streamed download response for the saved workbook"""
+        output = self.save()
+        output.seek(0, 2)
+        size = output.tell()
+        output.seek(0)
+
+        def generate():
+            try:
+                while True:
+                    chunk = output.read(STREAM_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                output.close()
+
+        response = Response(generate(), mimetype=XLSX_MIMETYPE)
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        response.headers['Content-Length'] = str(size)
+        return response
@@ -0,0 +1,176 @@
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from models import db, ExportJob
+
+
+class ExportJobQueue:
+    """Builds report exports on a worker pool and keeps the files for download.
+
+    Jobs are rows in the ExportJob table, so their status can be polled
+    from any worker process; the file is built by a thread pool in the
+    process that took the request and written to EXPORT_ARTIFACT_DIR.
+
+    A request with the same dedupe key as a job that is queued, running
+    or ready gets that job back instead of starting another build. Ready
+    artifacts are kept for EXPORT_ARTIFACT_TTL seconds and then deleted
+    by expire(). Jobs still queued or running after EXPORT_JOB_TIMEOUT
+    seconds are taken to have died with their process and are not reused.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.workers = 2
+        self.artifact_dir = None
+        self.ttl = 3600
+        self.timeout = 1800
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('EXPORT_JOB_WORKERS', 2)
+        self.artifact_dir = app.config.get('EXPORT_ARTIFACT_DIR') or os.path.join(app.instance_path, 'exports')
+        self.ttl = app.config.get('EXPORT_ARTIFACT_TTL', 3600)
+        self.timeout = app.config.get('EXPORT_JOB_TIMEOUT', 1800)
+        atexit.register(self.shutdown)
+
+    def submit(self, build, dedupe_key, **fields):
+        """Queue a new export job, or return the live job with the same key.
+
+        build(path) runs on a worker thread inside an app context. It must
+        write the artifact to path and return the file name to download
+        it as. Returns (job, created).
+        """
+        self.expire()
+        with self._lock:
+            job = self.find(dedupe_key)
+            if job is not None:
+                self.deduplicated += 1
+                return job, False
+
+            job = ExportJob(dedupe_key=dedupe_key, status='queued', **fields)
+            db.session.add(job)
+            db.session.commit()
+
+        self._ensure_executor().submit(self._run, job.id, build)
+        self.submitted += 1
+        return job, True
+
+    def find(self, dedupe_key):
+        """The newest reusable job for dedupe_key, if any"""
+        now = datetime.utcnow()
+        job = ExportJob.query.filter(
+            ExportJob.dedupe_key == dedupe_key,
+            db.or_(
+                db.and_(ExportJob.status.in_(('queued', 'running')),
+                        ExportJob.created_at >= now - timedelta(seconds=self.timeout)),
+                db.and_(ExportJob.status == 'ready', ExportJob.expires_at > now)
+            )
+        ).order_by(ExportJob.id.desc()).first()
+
+        if job is not None and job.status == 'ready' and not os.path.exists(self.artifact_path(job)):
+            job.status = 'expired'
+            db.session.commit()
+            return None
+        return job
+
+    def artifact_path(self, job):
+        extension = 'xlsx' if job.format == 'excel' else 'csv'
+        return os.path.join(self.artifact_dir, f'export_{job.id}.{extension}')
+
+    def _ensure_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export-job')
+            return self._executor
+
+    def _run(self, job_id, build):
+        with self.app.app_context():
+            job = db.session.get(ExportJob, job_id)
+            if job is None:
+                return
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+
+            os.makedirs(self.artifact_dir, exist_ok=True)
+            path = self.artifact_path(job)
+            temp_path = f'{path}.tmp'
+            started = time.perf_counter()
+            try:
+                file_name = build(temp_path)
+                os.replace(temp_path, path)
+            except Exception as e:
+                db.session.rollback()
+                self._remove(temp_path)
+                job = db.session.get(ExportJob, job_id)
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                self.failed += 1
+                self.app.logger.error(f"Export job {job_id} failed: {str(e)}")
+                return
+
+            job = db.session.get(ExportJob, job_id)
+            job.status = 'ready'
+            job.file_name = file_name
+            job.file_size = os.path.getsize(path)
+            job.finished_at = datetime.utcnow()
+            job.expires_at = job.finished_at + timedelta(seconds=self.ttl)
+            db.session.commit()
+            self.completed += 1
+            self.app.logger.info(
+                f"Export job {job_id} ({job.export_type}) built in {time.perf_counter() - started:.1f}s, "
+                f"{job.file_size} bytes"
+            )
+
+    def expire(self):
+        """Delete artifacts past their expiry time; returns how many were removed"""
+        jobs = ExportJob.query.filter(
+            ExportJob.status == 'ready',
+            ExportJob.expires_at <= datetime.utcnow()
+        ).all()
+        for job in jobs:
+            self._remove(self.artifact_path(job))
+            job.status = 'expired'
+        if jobs:
+            db.session.commit()
+            self.expired += len(jobs)
+        return len(jobs)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def shutdown(self):
+        """Stop taking jobs; builds already running are left to finish"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'artifact_ttl_seconds': self.ttl,
+            'submitted': self.submitted,
+            'deduplicated': self.deduplicated,
+            'completed': self.completed,
+            'failed': self.failed,
+            'in_flight': self.submitted - self.completed - self.failed,
+            'expired': self.expired
+        }
@@ -4,7 +4,9 @@ from datetime import datetime, date, timedelta, timezone
 import json
 from decimal import Decimal
 
-db = SQLAlchemy()
+from replica import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class User(db.Model):
@@ -311,8 +313,13 @@ class DailyStock(db.Model):
         db.Index('idx_product_date', 'product_id', 'date'),
     )
 
-    def calculate_closing_stock(self):
-        """Calculate closing stock and update product's current stock"""
+    def calculate_closing_stock(self, sync_product=True):
+        """Calculate closing stock and update product's current stock.
+
+        Pass sync_product=False when the product's stock has already been
+        adjusted atomically in SQL, so the absolute value is not written back
+        over concurrent decrements.
+        """
         opening = self.opening_stock if self.opening_stock is not None else 0
         additions = self.additions if self.additions is not None else 0
         sales = self.sales_quantity if self.sales_quantity is not None else 0
@@ -320,7 +327,7 @@ class DailyStock(db.Model):
         self.closing_stock = max(0, opening + additions - sales)
 
         # Update product's current stock immediately
-        if self.product:
+        if sync_product and self.product:
             self.product.current_stock = self.closing_stock
             self.product.last_stock_update = datetime.now(timezone.utc)
 
@@ -357,6 +364,8 @@ class Sale(db.Model):
     discount_value = db.Column(db.Float, default=0)
     discount_amount = db.Column(db.Float, default=0)
     total_amount = db.Column(db.Float, nullable=False)
+    unit_cost = db.Column(db.Float, nullable=True)  # Cost per variant unit when the sale was made
+    cost_amount = db.Column(db.Float, nullable=True)  # unit_cost * quantity
     cash_amount = db.Column(db.Float, default=0)
     mpesa_amount = db.Column(db.Float, default=0)
     credit_amount = db.Column(db.Float, default=0)
@@ -387,15 +396,23 @@ class Sale(db.Model):
         self.total_amount = self.original_amount - self.discount_amount
         return self.discount_amount
 
+    def calculate_cost(self, variant=None):
+        """Set cost_amount, freezing unit_cost at the current buying price on first use"""
+        if self.unit_cost is None:
+            variant = variant or self.variant
+            self.unit_cost = variant.product.base_buying_price * variant.conversion_factor
+        self.cost_amount = self.unit_cost * self.quantity
+        return self.cost_amount
+
     def get_base_units_sold(self):
         """Calculate how many base units this sale represents"""
         return self.quantity * self.variant.conversion_factor
 
     def get_profit(self):
         """Calculate profit for this sale"""
-        cost_per_variant = self.variant.product.base_buying_price * self.variant.conversion_factor
-        total_cost = cost_per_variant * self.quantity
-        return self.total_amount - total_cost
+        if self.cost_amount is None:
+            return self.total_amount - self.variant.product.base_buying_price * self.variant.conversion_factor * self.quantity
+        return self.total_amount - self.cost_amount
 
     def to_dict(self):
         return {
@@ -414,6 +431,8 @@ class Sale(db.Model):
             'discount_value': self.discount_value,
             'discount_amount': self.discount_amount,
             'total_amount': self.total_amount,
+            'unit_cost': self.unit_cost,
+            'cost_amount': self.cost_amount,
             'cash_amount': self.cash_amount,
             'mpesa_amount': self.mpesa_amount,
             'credit_amount': self.credit_amount,
@@ -434,6 +453,7 @@ class Sale(db.Model):
 class DailySummary(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False, unique=True, index=True)
+    total_transactions = db.Column(db.Integer, default=0)
     total_sales = db.Column(db.Float, default=0)
     total_cost = db.Column(db.Float, default=0)
     total_profit = db.Column(db.Float, default=0)
@@ -451,6 +471,7 @@ class DailySummary(db.Model):
         return {
             'id': self.id,
             'date': self.date.isoformat() if self.date else None,
+            'total_transactions': self.total_transactions,
             'total_sales': self.total_sales,
             'total_cost': self.total_cost,
             'total_profit': self.total_profit,
@@ -468,6 +489,82 @@ class DailySummary(db.Model):
         return f'<DailySummary {self.date}>'
 
 
+class ProductDailySales(db.Model):
+    """Per-product, per-day sales totals, kept up to date on every sale write"""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    quantity = db.Column(db.Float, nullable=False, default=0)  # Variant units sold
+    base_units = db.Column(db.Float, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    cost = db.Column(db.Float, nullable=False, default=0)
+    profit = db.Column(db.Float, nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    product = db.relationship('Product', backref=db.backref('daily_sales', lazy=True))
+
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'date', name='unique_product_daily_sales'),
+        db.Index('idx_product_daily_sales_date_product', 'date', 'product_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'product_name': self.product.name if self.product else None,
+            'date': self.date.isoformat() if self.date else None,
+            'quantity': self.quantity,
+            'base_units': self.base_units,
+            'revenue': self.revenue,
+            'cost': self.cost,
+            'profit': self.profit,
+            'transaction_count': self.transaction_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<ProductDailySales {self.product_id} {self.date}>'
+
+
+class AttendantDailySales(db.Model):
+    """Per-attendant, per-day sales totals, kept up to date on every sale write"""
+    id = db.Column(db.Integer, primary_key=True)
+    attendant_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    quantity = db.Column(db.Float, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    cost = db.Column(db.Float, nullable=False, default=0)
+    profit = db.Column(db.Float, nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    attendant = db.relationship('User', backref=db.backref('daily_sales', lazy=True))
+
+    __table_args__ = (
+        db.UniqueConstraint('attendant_id', 'date', name='unique_attendant_daily_sales'),
+        db.Index('idx_attendant_daily_sales_date_attendant', 'date', 'attendant_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'attendant_id': self.attendant_id,
+            'attendant_name': self.attendant.full_name if self.attendant else None,
+            'date': self.date.isoformat() if self.date else None,
+            'quantity': self.quantity,
+            'revenue': self.revenue,
+            'cost': self.cost,
+            'profit': self.profit,
+            'transaction_count': self.transaction_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<AttendantDailySales {self.attendant_id} {self.date}>'
+
+
 # Add this new model to your models.py file
 
 class StockPurchase(db.Model):
@@ -512,6 +609,77 @@ class StockPurchase(db.Model):
         return f'<StockPurchase {self.product.name if self.product else "Unknown"} x{self.quantity}>'
 
 
+class StockMovement(db.Model):
+    """Append-only ledger of every change to a product's stock, in base units"""
+    MOVEMENT_TYPES = ('sale', 'purchase', 'adjustment', 'reversal')
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    movement_type = db.Column(db.String(20), nullable=False, index=True)
+    quantity = db.Column(db.Float, nullable=False)  # Signed base units: negative takes stock out
+    movement_date = db.Column(db.Date, nullable=False, index=True)
+    reference_table = db.Column(db.String(50), nullable=True)
+    reference_id = db.Column(db.Integer, nullable=True)
+    notes = db.Column(db.String(200), nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    product = db.relationship('Product', backref=db.backref('stock_movements', lazy=True))
+    creator = db.relationship('User', backref=db.backref('stock_movements', lazy=True))
+
+    __table_args__ = (
+        db.Index('idx_movement_product_date', 'product_id', 'movement_date'),
+        db.Index('idx_movement_reference', 'reference_table', 'reference_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'product_name': self.product.name if self.product else None,
+            'movement_type': self.movement_type,
+            'quantity': self.quantity,
+            'movement_date': self.movement_date.isoformat() if self.movement_date else None,
+            'reference_table': self.reference_table,
+            'reference_id': self.reference_id,
+            'notes': self.notes,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<StockMovement {self.movement_type} {self.product_id} {self.quantity:+}>'
+
+
+class StockSnapshot(db.Model):
+    """End-of-day stock per product, taken from the movement ledger"""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    closing_stock = db.Column(db.Float, nullable=False, default=0)  # In base units
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    product = db.relationship('Product', backref=db.backref('stock_snapshots', lazy=True))
+
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'date', name='unique_snapshot_product_date'),
+        db.Index('idx_snapshot_product_date', 'product_id', 'date'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'product_name': self.product.name if self.product else None,
+            'date': self.date.isoformat() if self.date else None,
+            'closing_stock': self.closing_stock,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<StockSnapshot {self.product_id} {self.date}>'
+
+
 class AuditLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
@@ -530,7 +698,74 @@ class AuditLog(db.Model):
     __table_args__ = (
         db.Index('idx_audit_timestamp_user', 'timestamp', 'user_id'),
         db.Index('idx_audit_action_table', 'action', 'table_name'),
+        db.Index('idx_audit_timestamp_id', 'timestamp', 'id'),
+        db.Index('idx_audit_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<AuditLog {self.user.username} {self.action} {self.table_name}>'
+
+
+class AuditArchive(db.Model):
+    """Index of monthly audit log archive files"""
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.String(7), nullable=False, unique=True)  # YYYY-MM
+    file_name = db.Column(db.String(100), nullable=False)
+    min_id = db.Column(db.Integer, nullable=True)
+    max_id = db.Column(db.Integer, nullable=True)
+    row_count = db.Column(db.Integer, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_audit_archive_ids', 'min_id', 'max_id'),
     )
 
     def __repr__(self):
-        return f'<AuditLog {self.user.username} {self.action} {self.table_name}>'
\ No newline at end of file
+        return f'<AuditArchive {self.month} ({self.row_count} rows)>'
+
+
+class ExportJob(db.Model):
+    """A report export built in the background, and the artifact it produced"""
+    id = db.Column(db.Integer, primary_key=True)
+    dedupe_key = db.Column(db.String(200), nullable=False)
+    export_type = db.Column(db.String(20), nullable=False)
+    format = db.Column(db.String(10), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    scope = db.Column(db.String(30), nullable=False)  # role, or user:<id> for attendants
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, ready, failed, expired
+    file_name = db.Column(db.String(200), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User', backref=db.backref('export_jobs', lazy=True))
+
+    __table_args__ = (
+        db.Index('idx_export_job_dedupe_status', 'dedupe_key', 'status'),
+        db.Index('idx_export_job_status_expires', 'status', 'expires_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'export_type': self.export_type,
+            'format': self.format,
+            'start_date': self.start_date.isoformat() if self.start_date else None,
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'status': self.status,
+            'file_name': self.file_name,
+            'file_size': self.file_size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.export_type} {self.status}>'
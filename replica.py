@@ -0,0 +1,307 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context, has_request_context, request, session as flask_session, stream_with_context
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(FlaskSession):
+    """Session that sends reads to the replica while a view asks for it.
+
+    Only SELECTs outside a flush are routed. Flushes and INSERT, UPDATE
+    and DELETE statements always go to the primary, and the session
+    remembers that it wrote there.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get('use_read_replica'):
+            if not self._flushing and clause is not None and getattr(clause, 'is_select', False):
+                engine = self._db.engines.get(REPLICA_BIND)
+                if engine is not None:
+                    return engine
+        if self._flushing or (clause is not None and getattr(clause, 'is_dml', False)):
+            self.info['wrote_primary'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    """Chooses between the primary database and a read replica per request.
+
+    Modes (READ_REPLICA_MODE):
+
+    * ``replica`` - reads go to DATABASE_REPLICA_URL. On PostgreSQL the
+      replay lag is checked and the primary is used while it exceeds
+      READ_REPLICA_MAX_STALENESS seconds.
+    * ``snapshot`` - for a SQLite primary: reads go to a read-only copy
+      of the database file, taken with SQLite's backup API. The copy is
+      refreshed on a background thread once it is half way to
+      READ_REPLICA_MAX_STALENESS seconds old; while it is older than
+      that, requests use the primary. Worker processes share the file
+      and pick up each other's refreshes by its modification time.
+    * ``off`` - everything uses the primary.
+
+    ``auto`` (the default) picks ``replica`` when a replica URL is set and
+    ``off`` otherwise; ``snapshot`` has to be asked for, as every refresh
+    copies the whole database.
+
+    A request stays on the primary when it passes ``read_from=primary``
+    (query string) or an ``X-Read-From: primary`` header. It also stays
+    on the primary when the same browser session committed a write
+    within the staleness bound, so users always see their own changes.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.db = None
+        self.mode = 'off'
+        self.max_staleness = 30
+        self.snapshot_path = None
+        self.preload = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self._snapshot_mtime = None
+        self._lag_checked_at = 0
+        self._lag_ok = True
+        self.refreshes = 0
+        self.routed_requests = 0
+        self.primary_requests = 0
+
+    def configure(self, app):
+        """Register the replica bind; must run before db.init_app(app)"""
+        self.app = app
+        app.config.setdefault('READ_REPLICA_MODE', 'auto')
+        app.config.setdefault('READ_REPLICA_MAX_STALENESS', 30)
+        app.config.setdefault('READ_REPLICA_SNAPSHOT_PATH', os.path.join(app.instance_path, 'read_replica.db'))
+        self.max_staleness = app.config['READ_REPLICA_MAX_STALENESS']
+
+        mode = app.config['READ_REPLICA_MODE']
+        replica_url = app.config.get('DATABASE_REPLICA_URL')
+        primary_url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        primary_is_sqlite_file = primary_url.get_backend_name() == 'sqlite' and \
+            primary_url.database not in (None, '', ':memory:')
+        if mode == 'auto':
+            mode = 'replica' if replica_url else 'off'
+        if mode == 'snapshot' and not primary_is_sqlite_file:
+            mode = 'off'
+        if mode == 'replica' and not replica_url:
+            mode = 'off'
+        self.mode = mode
+
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        if mode == 'replica':
+            binds[REPLICA_BIND] = replica_url
+        elif mode == 'snapshot':
+            self.snapshot_path = app.config['READ_REPLICA_SNAPSHOT_PATH']
+            binds[REPLICA_BIND] = f"sqlite:///file:{self.snapshot_path}?mode=ro&uri=true"
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    def init_app(self, app, db, preload=None):
+        """Hook into the session once db.init_app(app) has created the engines"""
+        self.db = db
+        self.preload = preload
+
+        @event.listens_for(db.session, 'after_commit')
+        def _remember_write(session):
+            if session.info.pop('wrote_primary', False) and has_request_context():
+                flask_session['last_write_at'] = time.time()
+
+        @event.listens_for(db.session, 'after_rollback')
+        def _forget_write(session):
+            session.info.pop('wrote_primary', None)
+
+    def wants_primary(self):
+        if self.mode == 'off':
+            return True
+        if request.args.get('read_from') == 'primary' or request.headers.get('X-Read-From') == 'primary':
+            return True
+        last_write_at = flask_session.get('last_write_at')
+        return last_write_at is not None and time.time() - last_write_at < self.max_staleness
+
+    def replica_ready(self):
+        """Whether the replica is within the staleness bound"""
+        if self.mode == 'snapshot':
+            age = self._snapshot_age()
+            if age is None or age > self.max_staleness / 2:
+                self._start_refresh()
+            if age is None or age > self.max_staleness:
+                return False
+            self._follow_snapshot()
+            return True
+        if self.mode == 'replica':
+            return self._replica_lag_ok()
+        return False
+
+    def _snapshot_age(self):
+        try:
+            return time.time() - os.path.getmtime(self.snapshot_path)
+        except OSError:
+            return None
+
+    def _follow_snapshot(self):
+        """Drop pooled connections that still read a snapshot file since replaced"""
+        try:
+            mtime = os.path.getmtime(self.snapshot_path)
+        except OSError:
+            return
+        with self._lock:
+            if mtime != self._snapshot_mtime:
+                if self._snapshot_mtime is not None:
+                    self.db.engines[REPLICA_BIND].dispose()
+                self._snapshot_mtime = mtime
+
+    def _start_refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, name='replica-snapshot', daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            with self.app.app_context():
+                self.refresh_snapshot()
+        except Exception as e:
+            self.app.logger.error(f"Could not refresh the read replica snapshot: {str(e)}")
+        finally:
+            self._refreshing = False
+
+    def refresh_snapshot(self, force=False):
+        """Copy the primary SQLite file to the snapshot with the backup API.
+
+        The copy is written to a temporary file of its own in the snapshot's
+        directory and moved into place, so processes refreshing at the same
+        time never replace the snapshot with a half-written file.
+        """
+        with self._refresh_lock:
+            age = self._snapshot_age()
+            if not force and age is not None and age <= self.max_staleness / 2:
+                return False
+
+            primary_path = self.db.engine.url.database
+            if primary_path.startswith('file:'):
+                primary_path = primary_path[5:]
+            directory, name = os.path.split(self.snapshot_path)
+            fd, temp_path = tempfile.mkstemp(prefix=f'{name}.', suffix='.tmp', dir=directory or None)
+            os.close(fd)
+
+            try:
+                source = sqlite3.connect(primary_path)
+                target = sqlite3.connect(temp_path)
+                try:
+                    source.backup(target)
+                    # Read-only connections cannot use WAL without its -shm file
+                    target.execute('PRAGMA journal_mode=DELETE')
+                finally:
+                    target.close()
+                    source.close()
+                os.replace(temp_path, self.snapshot_path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+            self._follow_snapshot()
+            self.refreshes += 1
+            return True
+
+    def _replica_lag_ok(self):
+        now = time.time()
+        if now - self._lag_checked_at < 5:
+            return self._lag_ok
+        engine = self.db.engines[REPLICA_BIND]
+        lag_ok = True
+        if engine.dialect.name == 'postgresql':
+            try:
+                with engine.connect() as connection:
+                    lag = connection.exec_driver_sql(
+                        'SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())'
+                    ).scalar()
+                lag_ok = lag is None or lag <= self.max_staleness
+            except Exception as e:
+                self.app.logger.warning(f"Could not check replica lag, reading from primary: {str(e)}")
+                lag_ok = False
+        self._lag_checked_at = now
+        self._lag_ok = lag_ok
+        return lag_ok
+
+    def use_replica(self):
+        """Route this request's reads to the replica if allowed; returns True if routed"""
+        if self.wants_primary() or not self.replica_ready():
+            self.primary_requests += 1
+            return False
+        if self.preload is not None:
+            # Identity must come from the primary; a new user may not be on the replica yet
+            self.preload()
+        g.use_read_replica = True
+        self.routed_requests += 1
+        return True
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'max_staleness_seconds': self.max_staleness,
+            'snapshot_age_seconds': self._snapshot_age() if self.mode == 'snapshot' else None,
+            'snapshot_refreshes': self.refreshes,
+            'routed_requests': self.routed_requests,
+            'primary_requests': self.primary_requests
+        }
+
+
+replica_router = ReplicaRouter()
+
+
+def read_replica(f):
+    """Serve a read-only view from the read replica when possible"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        replica_router.use_replica()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.pop('use_read_replica', None)
+    return decorated_function
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside a replica-routed view.
+
+    Use it for results that are cached beyond the request, so a stale
+    replica read is not kept for the cache's whole lifetime.
+    """
+    routed = g.pop('use_read_replica', None) if has_app_context() else None
+    try:
+        yield
+    finally:
+        if routed:
+            g.use_read_replica = routed
+
+
+def stream_with_read_routing(iterable):
+    """Stream a response body, keeping the view's read routing.
+
+    read_replica drops the routing flag when the view returns, which is
+    before a streamed body is generated, so the flag is put back around
+    the generator.
+    """
+    routed = g.get('use_read_replica')
+
+    def generate():
+        if routed:
+            g.use_read_replica = routed
+        try:
+            yield from iterable
+        finally:
+            g.pop('use_read_replica', None)
+
+    return stream_with_context(generate())
@@ -0,0 +1,137 @@
+import base64
+import re
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import audit_filter_cache, audit_writer, encode_audit_cursor, get_audit_filter_values
+from models import db, AuditLog, User
+
+LOG_LINK = re.compile(r'href="/audit_log/(\d+)"')
+OLDER_LINK = re.compile(r'href="/audit_logs\?before=([^&"]+)')
+NEWER_LINK = re.compile(r'href="/audit_logs\?after=([^&"]+)')
+
+
+def add_audit_rows(app, table_name, timestamps):
+    with app.app_context():
+        admin_id = User.query.filter_by(role='admin').first().id
+        db.session.execute(db.insert(AuditLog), [
+            {'user_id': admin_id, 'action': 'UPDATE', 'table_name': table_name, 'record_id': index,
+             'changes_summary': f'{table_name} {index}',
+             'timestamp': timestamp}
+            for index, timestamp in enumerate(timestamps)
+        ])
+        db.session.commit()
+        return [log_id for log_id, in db.session.query(AuditLog.id).filter(AuditLog.table_name == table_name)
+                .order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).all()]
+
+
+def audit_page(client, **params):
+    body = client.get('/audit_logs', query_string=params).get_data(as_text=True)
+    older = OLDER_LINK.search(body)
+    newer = NEWER_LINK.search(body)
+    return ([int(log_id) for log_id in LOG_LINK.findall(body)],
+            older.group(1) if older else None,
+            newer.group(1) if newer else None)
+
+
+def test_cursors_walk_every_row_once_across_equal_timestamps(app, login):
+    started = datetime(2022, 1, 1, 12, 0)
+    # Three rows share each timestamp, so pages split inside a timestamp
+    expected = add_audit_rows(app, 'cursor_walk', [started + timedelta(minutes=index // 3) for index in range(23)])
+    client = login('admin')
+
+    pages = []
+    ids, older, newer = audit_page(client, table='cursor_walk', per_page=5)
+    assert newer is None
+    pages.append(ids)
+    while older:
+        ids, older, newer = audit_page(client, table='cursor_walk', per_page=5, before=older)
+        pages.append(ids)
+
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert [log_id for page in pages for log_id in page] == expected
+
+    # And back again with the newer cursors
+    back = [pages[-1]]
+    while newer:
+        ids, older, newer = audit_page(client, table='cursor_walk', per_page=5, after=newer)
+        back.append(ids)
+    assert [log_id for page in reversed(back) for log_id in page] == expected
+
+
+def test_malformed_cursor_falls_back_to_the_first_page(app, login):
+    add_audit_rows(app, 'bad_cursor', [datetime(2022, 2, 1)] * 4)
+    client = login('admin')
+    first_page = audit_page(client, per_page=3)
+    assert len(first_page[0]) == 3
+
+    not_a_timestamp = base64.urlsafe_b64encode(b'yesterday|12').decode()
+    not_an_id = base64.urlsafe_b64encode(b'2022-02-01T00:00:00|twelve').decode()
+    for cursor in ['not-a-cursor', '!!!', '\u00e9', not_a_timestamp, not_an_id]:
+        assert audit_page(client, per_page=3, before=cursor) == first_page, cursor
+        assert audit_page(client, per_page=3, after=cursor) == first_page, cursor
+
+
+def test_filter_lists_refresh_after_a_new_table_is_audited(app):
+    with app.app_context():
+        audit_filter_cache.invalidate()
+        assert 'filter_refresh' not in get_audit_filter_values()['tables']
+        admin_id = User.query.filter_by(role='admin').first().id
+
+        audit_writer.record(user_id=admin_id, action='ARCHIVE', table_name='filter_refresh', record_id=1,
+                            timestamp=datetime.utcnow())
+        # Not dropped until the row is committed
+        assert audit_filter_cache.peek('filter_values') is not None
+        db.session.commit()
+
+        filter_values = get_audit_filter_values()
+        assert 'filter_refresh' in filter_values['tables']
+        assert 'ARCHIVE' in filter_values['actions']
+
+
+def test_deep_pages_cost_the_same_as_the_first_page(app, login):
+    """Scaled-down large-table benchmark: 50k rows, first page vs. a page near the end"""
+    started = datetime(2021, 1, 1)
+    ids = add_audit_rows(app, 'benchmark', [started + timedelta(seconds=index // 2) for index in range(50000)])
+    client = login('admin')
+    with app.app_context():
+        deep_cursor = encode_audit_cursor(db.session.get(AuditLog, ids[-100]))
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM audit_log' in statement and 'LIMIT' in statement:
+            statements.append((statement, parameters))
+
+    def timed(**params):
+        timings = []
+        for _ in range(5):
+            request_started = time.perf_counter()
+            audit_page(client, per_page=50, **params)
+            timings.append(time.perf_counter() - request_started)
+        return statistics.median(timings)
+
+    first_page = timed()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        deep_page = timed(before=deep_cursor)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    assert audit_page(client, per_page=50, before=deep_cursor)[0] == ids[-99:-49]
+    assert deep_page < first_page * 2 + 0.02, f'first page {first_page:.4f}s, deep page {deep_page:.4f}s'
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            statement, parameters = statements[-1]
+            plan = ' '.join(str(row[-1]) for row in db.session.connection().exec_driver_sql(
+                f'EXPLAIN QUERY PLAN {statement}', parameters).all())
+            # The cursor seeks into a timestamp index and reads it in order
+            # instead of scanning and sorting the table
+            assert re.search(r'SEARCH audit_log USING (COVERING )?INDEX \w+ \(timestamp<\?\)', plan), plan
+            assert 'TEMP B-TREE' not in plan
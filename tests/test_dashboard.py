@@ -0,0 +1,113 @@
+from datetime import date
+
+import app as app_module
+from app import dashboard_cache, get_dashboard_metrics
+from models import db, ExpenseCategory, Product, Sale, User
+
+
+def metrics_for(app, role, selected_date):
+    with app.test_request_context():
+        user = User.query.filter_by(role=role).first()
+        return get_dashboard_metrics(user, selected_date)
+
+
+def test_dashboard_metrics_are_cached_per_user_and_date(app, monkeypatch):
+    calls = []
+    compute = app_module.compute_dashboard_metrics
+    monkeypatch.setattr(app_module, 'compute_dashboard_metrics',
+                        lambda *args: calls.append(args) or compute(*args))
+    dashboard_cache.invalidate()
+
+    first = metrics_for(app, 'manager', date(2024, 2, 10))
+    second = metrics_for(app, 'manager', date(2024, 2, 10))
+    metrics_for(app, 'manager', date(2024, 2, 11))
+    metrics_for(app, 'attendant', date(2024, 2, 10))
+
+    assert second == first
+    assert [args[0] for args in calls] == ['manager', 'manager', 'attendant']
+
+
+def test_sale_commit_invalidates_the_cached_dashboard(app, login, make_product, checkout):
+    _, variant_id = make_product('Dashboard Cognac')
+    sale_date = date.today()
+    before = metrics_for(app, 'admin', sale_date)
+
+    checkout(login('admin'), variant_id, 2, sale_date)
+    after = metrics_for(app, 'admin', sale_date)
+
+    assert after['today_stats']['total_sales'] == before['today_stats']['total_sales'] + 3000
+    assert after['today_stats']['total_transactions'] == before['today_stats']['total_transactions'] + 1
+    assert after['recent_sales'][0]['variant_name'].startswith('Dashboard Cognac')
+
+
+def test_expense_commit_invalidates_the_cached_dashboard(app, login):
+    with app.app_context():
+        category = ExpenseCategory(name='Dashboard Utilities')
+        db.session.add(category)
+        db.session.commit()
+        category_id = category.id
+    expense_date = date(2024, 4, 12)
+    before = metrics_for(app, 'admin', expense_date)
+
+    login('admin').post('/add_expense', data={
+        'description': 'Electricity',
+        'amount': '750',
+        'expense_category_id': category_id,
+        'expense_date': expense_date.isoformat()
+    })
+    after = metrics_for(app, 'admin', expense_date)
+
+    assert after['today_stats']['total_expenses'] == before['today_stats']['total_expenses'] + 750
+    assert after['month_stats']['net_profit'] == before['month_stats']['net_profit'] - 750
+
+
+def test_month_to_date_from_summaries_matches_live_totals(app, login, make_product, checkout):
+    _, variant_id = make_product('Dashboard Tequila')
+    client = login('admin')
+    checkout(client, variant_id, 1, date(2024, 5, 3))
+    checkout(client, variant_id, 2, date(2024, 5, 9))
+    checkout(client, variant_id, 4, date(2024, 5, 20))  # after the selected date
+
+    metrics = metrics_for(app, 'admin', date(2024, 5, 9))
+
+    with app.app_context():
+        live_total = db.session.query(db.func.sum(Sale.total_amount)).filter(
+            Sale.sale_date.between(date(2024, 5, 1), date(2024, 5, 9))
+        ).scalar()
+    assert metrics['month_stats']['total_sales'] == live_total == 4500
+    assert metrics['today_stats']['total_sales'] == 3000
+
+
+def test_dashboard_query_count_cold_and_warm(app, login, count_statements):
+    client = login('manager')
+    client.get('/dashboard')
+    dashboard_cache.invalidate()
+
+    with count_statements() as cold:
+        assert client.get('/dashboard').status_code == 200
+    with count_statements() as warm:
+        assert client.get('/dashboard').status_code == 200
+
+    # user; day sales, day expenses, earlier days of the month; low stock
+    # count and list; recent sales; top products
+    assert len(cold) == 8
+    # Served from the cache: only the user is loaded
+    assert len(warm) == 1
+
+
+def test_low_stock_alerts_are_counted_in_sql_and_capped(app, make_product, count_statements):
+    for index in range(12):
+        make_product(f'Low Stock Rum {index:02d}', current_stock=index % 4)
+    dashboard_cache.invalidate()
+
+    with count_statements() as statements:
+        metrics = metrics_for(app, 'admin', date(2024, 6, 1))
+
+    with app.app_context():
+        low_stock = Product.query.filter(Product.current_stock <= Product.min_stock_level) \
+            .order_by(Product.current_stock, Product.id).all()
+    assert metrics['low_stock_count'] == len(low_stock) >= 12
+    assert [row['id'] for row in metrics['stock_alerts']] == [product.id for product in low_stock[:10]]
+    product_lists = [statement for statement in statements
+                     if statement.startswith('SELECT') and 'FROM product' in statement and 'count(' not in statement]
+    assert product_lists and all('LIMIT' in statement for statement in product_lists)
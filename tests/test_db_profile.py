@@ -0,0 +1,185 @@
+import threading
+import time
+from datetime import date
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.schema import CreateTable
+
+from app import product_sales_rollup_query
+from db_profile import (SERVER_DEFAULTS, SQLITE_DEFAULTS, apply_engine_profile, attach_sqlite_pragmas,
+                        database_uri_from_env, sqlite_engine_options)
+from models import db
+
+
+@pytest.fixture
+def sqlite_only(app):
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            pytest.skip('SQLite profile')
+
+
+def profile_engine(path, **overrides):
+    config = dict(SQLITE_DEFAULTS, **overrides)
+    uri = f'sqlite:///{path}'
+    engine = create_engine(uri, **sqlite_engine_options(uri, config))
+    attach_sqlite_pragmas(engine, config)
+    return engine
+
+
+def journal_mode(engine):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql('PRAGMA journal_mode').scalar()
+
+
+def test_sqlite_connections_get_the_profile_pragmas(app, sqlite_only):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            pragma = lambda name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+            assert pragma('journal_mode') == 'wal'
+            assert pragma('synchronous') == 1  # NORMAL
+            assert pragma('busy_timeout') == app.config['SQLITE_BUSY_TIMEOUT_MS']
+            assert pragma('cache_size') == -SQLITE_DEFAULTS['SQLITE_CACHE_SIZE_KB']
+            assert pragma('temp_store') == 2  # MEMORY
+
+
+def test_sqlite_file_database_gets_a_queue_pool():
+    options = sqlite_engine_options('sqlite:////var/lib/onecore/store.db', SQLITE_DEFAULTS)
+
+    assert options['poolclass'] is QueuePool
+    assert options['pool_size'] == SQLITE_DEFAULTS['SQLITE_POOL_SIZE']
+    assert options['connect_args']['timeout'] == SQLITE_DEFAULTS['SQLITE_BUSY_TIMEOUT_MS'] / 1000
+    assert 'pool_pre_ping' not in options
+
+
+@pytest.mark.parametrize('uri', ['sqlite://', 'sqlite:///:memory:'])
+def test_sqlite_memory_database_shares_one_connection(uri):
+    assert sqlite_engine_options(uri, SQLITE_DEFAULTS)['poolclass'] is StaticPool
+
+
+def test_explicit_engine_options_override_the_profile():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///store.db'
+    app.config['SQLITE_JOURNAL_MODE'] = 'DELETE'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 2}
+
+    options = apply_engine_profile(app)
+
+    assert options['pool_size'] == 2
+    assert options['poolclass'] is QueuePool
+    assert app.config['SQLITE_BUSY_TIMEOUT_MS'] == SQLITE_DEFAULTS['SQLITE_BUSY_TIMEOUT_MS']
+
+
+def test_pragmas_are_attached_per_engine(app, sqlite_only, tmp_path):
+    tuned = profile_engine(tmp_path / 'tuned.db')
+    rollback_journal = profile_engine(tmp_path / 'rollback.db', SQLITE_JOURNAL_MODE='DELETE')
+    untouched = create_engine(f"sqlite:///{tmp_path / 'plain.db'}")
+
+    assert journal_mode(tuned) == 'wal'
+    assert journal_mode(rollback_journal) == 'delete'
+    assert journal_mode(untouched) == 'delete'
+    with app.app_context():
+        assert journal_mode(db.engine) == 'wal'
+
+
+def run_concurrent_writers(engine, writers=8, writes_per_writer=40):
+    """Writers append a row and bump a shared counter, while readers count the rows"""
+    with engine.begin() as connection:
+        connection.exec_driver_sql('CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)')
+        connection.exec_driver_sql('CREATE TABLE entry (id INTEGER PRIMARY KEY, writer INTEGER, payload TEXT)')
+        connection.exec_driver_sql('INSERT INTO counter (id, value) VALUES (1, 0)')
+
+    errors = []
+    writing = threading.Event()
+    writing.set()
+
+    def write(writer):
+        for _ in range(writes_per_writer):
+            try:
+                with engine.begin() as connection:
+                    connection.exec_driver_sql('INSERT INTO entry (writer, payload) VALUES (?, ?)',
+                                               (writer, 'x' * 200))
+                    connection.exec_driver_sql('UPDATE counter SET value = value + 1 WHERE id = 1')
+            except OperationalError as e:
+                errors.append(str(e.orig))
+
+    def read():
+        while writing.is_set():
+            try:
+                with engine.connect() as connection:
+                    connection.exec_driver_sql('SELECT COUNT(*), MAX(payload) FROM entry').all()
+            except OperationalError as e:
+                errors.append(str(e.orig))
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    threads = [threading.Thread(target=write, args=(writer,)) for writer in range(writers)]
+    started = time.perf_counter()
+    for thread in readers + threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    writing.clear()
+    for thread in readers:
+        thread.join()
+
+    with engine.connect() as connection:
+        committed = connection.exec_driver_sql('SELECT value FROM counter').scalar()
+    engine.dispose()
+    return {'errors': errors, 'committed': committed, 'writes_per_second': committed / elapsed}
+
+
+def test_concurrent_writers_are_not_locked_out(sqlite_only, tmp_path):
+    """Old vs. new settings: rollback journal without a busy timeout vs. the WAL profile"""
+    untuned = create_engine(f"sqlite:///{tmp_path / 'untuned.db'}",
+                            connect_args={'check_same_thread': False, 'timeout': 0})
+    before = run_concurrent_writers(untuned)
+    after = run_concurrent_writers(profile_engine(tmp_path / 'profile.db'))
+
+    summary = (f"untuned: {len(before['errors'])} lock errors, {before['writes_per_second']:.0f} writes/s; "
+               f"profile: {len(after['errors'])} lock errors, {after['writes_per_second']:.0f} writes/s")
+    # The workload contends: without the profile some writes fail
+    assert any('database is locked' in error for error in before['errors']), summary
+    assert after['errors'] == [], summary
+    assert after['committed'] == 8 * 40, summary
+
+
+def test_database_uri_from_env(monkeypatch):
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    assert database_uri_from_env('sqlite:///store.db') == 'sqlite:///store.db'
+
+    monkeypatch.setenv('DATABASE_URL', 'postgres://shop:secret@db/liquor_store')
+    assert database_uri_from_env('sqlite:///store.db') == 'postgresql://shop:secret@db/liquor_store'
+
+
+def test_server_database_gets_a_sized_pool():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://shop:secret@db/liquor_store'
+    app.config['DB_POOL_SIZE'] = 4
+
+    options = apply_engine_profile(app)
+
+    assert options == {
+        'pool_size': 4,
+        'max_overflow': SERVER_DEFAULTS['DB_MAX_OVERFLOW'],
+        'pool_timeout': SERVER_DEFAULTS['DB_POOL_TIMEOUT'],
+        'pool_recycle': SERVER_DEFAULTS['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def test_schema_and_report_orderings_compile_for_postgresql(app):
+    dialect = postgresql.dialect()
+    for table in db.metadata.sorted_tables:
+        CreateTable(table).compile(dialect=dialect)
+
+    with app.app_context():
+        query = product_sales_rollup_query(date(2024, 1, 1), date(2024, 1, 31)) \
+            .order_by(db.desc('total_sales'))
+        sql = str(query.statement.compile(dialect=dialect))
+
+    assert 'ORDER BY total_sales DESC' in sql
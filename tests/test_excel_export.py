@@ -0,0 +1,141 @@
+import time
+import tracemalloc
+from datetime import date
+from io import BytesIO
+
+import openpyxl
+
+from excel_export import MAX_COLUMN_WIDTH, XLSX_MIMETYPE, StreamingWorkbook
+
+
+def load(response):
+    return openpyxl.load_workbook(BytesIO(response.get_data()))
+
+
+def test_sheet_has_title_headers_and_every_row(app):
+    workbook = StreamingWorkbook(sample_rows=2)
+    rows = ([index, f'Product {index}', index * 1500] for index in range(5))
+
+    count = workbook.add_sheet('Sales Report', rows, headers=['#', 'Product', 'Amount'], title='Sales Report')
+    with app.test_request_context():
+        response = workbook.response('sales.xlsx')
+
+    assert count == 5
+    assert workbook.row_counts == {'Sales Report': 5}
+    assert response.mimetype == XLSX_MIMETYPE
+    assert response.headers['Content-Disposition'] == 'attachment; filename=sales.xlsx'
+    body = response.get_data()
+    assert int(response.headers['Content-Length']) == len(body)
+
+    ws = openpyxl.load_workbook(BytesIO(body))['Sales Report']
+    assert ws['A1'].value == 'Sales Report'
+    assert ws['A1'].font.bold
+    assert [str(merged) for merged in ws.merged_cells.ranges] == ['A1:C1']
+    assert [cell.value for cell in ws[3]] == ['#', 'Product', 'Amount']
+    assert ws['A3'].font.bold
+    # Rows past the width sample are written too
+    assert [[cell.value for cell in row] for row in ws.iter_rows(min_row=4)] == [
+        [index, f'Product {index}', index * 1500] for index in range(5)
+    ]
+
+
+def test_column_widths_come_from_the_sampled_rows():
+    workbook = StreamingWorkbook(sample_rows=2)
+    rows = [['a', 'x' * 10], ['b', 'y' * 200], ['c', 'z' * 30]]
+
+    workbook.add_sheet('Widths', rows, headers=['Code', 'Name'])
+
+    dimensions = openpyxl.load_workbook(workbook.save())['Widths'].column_dimensions
+    assert dimensions['A'].width == len('Code') + 2
+    # Capped, and the 30-character third row is outside the sample
+    assert dimensions['B'].width == MAX_COLUMN_WIDTH
+
+
+def test_long_sheet_names_are_cut_to_the_excel_limit():
+    workbook = StreamingWorkbook()
+
+    workbook.add_sheet('Product Sales By Category And Size', [[1]])
+
+    assert workbook.row_counts == {'Product Sales By Category And S': 1}
+    assert openpyxl.load_workbook(workbook.save()).sheetnames == ['Product Sales By Category And S']
+
+
+def test_large_workbook_spills_to_disk(app):
+    workbook = StreamingWorkbook(spool_max_bytes=1024)
+    workbook.add_sheet('Rows', ([index, f'Row {index}'] for index in range(2000)))
+
+    output = workbook.save()
+    try:
+        assert output._rolled
+        assert openpyxl.load_workbook(output)['Rows'].max_row == 2000
+    finally:
+        output.close()
+
+
+def report_rows(row_count):
+    for index in range(row_count):
+        yield [index, f'Product number {index}', 1500.0, 'cash']
+
+
+def build_in_memory_workbook(headers, rows):
+    """The report as it was built before StreamingWorkbook: every cell held, widths from every cell"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
+    for column in ws.columns:
+        width = max(len(str(cell.value)) if cell.value is not None else 0 for cell in column)
+        ws.column_dimensions[column[0].column_letter].width = min(width + 2, MAX_COLUMN_WIDTH)
+    output = BytesIO()
+    wb.save(output)
+    return output
+
+
+def build_streaming_workbook(headers, rows):
+    # Spill straight to disk so only the writer itself is measured
+    workbook = StreamingWorkbook(spool_max_bytes=1)
+    workbook.add_sheet('Rows', rows, headers=headers)
+    return workbook.save()
+
+
+def traced(build, row_count):
+    """Seconds and peak traced allocation for building a row_count-row report"""
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        build(['#', 'Product', 'Amount', 'Payment'], report_rows(row_count)).close()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def test_streaming_workbook_memory_stays_flat_and_below_the_in_memory_build():
+    """Scaled-down benchmark: the same report built both ways"""
+    old_time, old_peak = traced(build_in_memory_workbook, 5000)
+    small_time, small_peak = traced(build_streaming_workbook, 1000)
+    new_time, new_peak = traced(build_streaming_workbook, 5000)
+
+    summary = (f'in-memory {old_time:.2f}s {old_peak} bytes, streaming {new_time:.2f}s {new_peak} bytes, '
+               f'streaming 1k rows {small_peak} bytes')
+    assert new_peak < old_peak / 5, summary
+    # Five times the rows, about the same peak
+    assert new_peak < small_peak * 1.5, summary
+    assert new_time < old_time * 1.5, summary
+
+
+def test_full_report_writes_every_sheet(app, login, make_product, checkout):
+    _, variant_id = make_product('Reported Whisky')
+    client = login('admin')
+    checkout(client, variant_id, 2, date(2023, 9, 5))
+
+    response = client.get('/reports/export/full?format=excel&start_date=2023-09-01&end_date=2023-09-30')
+
+    assert response.status_code == 200
+    workbook = load(response)
+    assert workbook.sheetnames == ['Summary', 'Sales', 'Product Sales', 'Expenses']
+    assert workbook['Summary']['A1'].value == 'Business Summary Report'
+    sales = [[cell.value for cell in row] for row in workbook['Sales'].iter_rows(min_row=2)]
+    assert [(row[1], row[3], row[5]) for row in sales] == [('Reported Whisky', 2, 3000)]
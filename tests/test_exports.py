@@ -0,0 +1,164 @@
+import csv
+import os
+import time
+import tracemalloc
+from datetime import date
+from io import StringIO
+
+import openpyxl
+from flask import has_request_context
+
+import app as app_module
+from app import create_csv_report, write_export_artifact
+from models import User
+
+SALES_HEADERS = [
+    'Date', 'Product', 'Size', 'Quantity', 'Unit Price', 'Original Amount',
+    'Discount', 'Total Amount', 'Payment Method', 'Attendant', 'Customer'
+]
+
+
+def test_sales_csv_export_streams_every_row(app, login, make_product, checkout):
+    _, variant_id = make_product('Exported Gin')
+    client = login('admin')
+    for day in (2, 3, 4):
+        checkout(client, variant_id, day, date(2023, 7, day))
+    checkout(client, variant_id, 1, date(2023, 8, 1))  # outside the range
+
+    response = client.get('/reports/export/sales?format=csv&start_date=2023-07-01&end_date=2023-07-31')
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'filename=sales_report_2023-07-01_2023-07-31.csv' in response.headers['Content-Disposition']
+    rows = list(csv.reader(StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ['Sales Report']
+    assert rows[2] == SALES_HEADERS
+    assert [(row[0], row[1], row[3]) for row in rows[3:]] == [
+        ('2023-07-04', 'Exported Gin', '4.0'),
+        ('2023-07-03', 'Exported Gin', '3.0'),
+        ('2023-07-02', 'Exported Gin', '2.0'),
+    ]
+
+
+def test_csv_report_is_written_in_chunks_as_rows_are_read(app, monkeypatch):
+    monkeypatch.setattr(app_module, 'CSV_EXPORT_CHUNK_BYTES', 1024)
+    rows_read = []
+
+    def rows():
+        for index in range(1000):
+            rows_read.append(index)
+            yield [index, f'Product {index}', 1500]
+
+    chunks = create_csv_report('Big Report', ['#', 'Product', 'Amount'], rows(), 'big.csv').chunks
+    first_chunk = next(chunks)
+    rows_read_for_first_chunk = len(rows_read)
+    chunks = [first_chunk] + list(chunks)
+
+    assert rows_read_for_first_chunk < 100
+    assert len(chunks) > 10
+    assert all(len(chunk) < 1024 + 100 for chunk in chunks)
+    lines = ''.join(chunks).splitlines()
+    assert lines[:3] == ['Big Report', '', '#,Product,Amount']
+    assert len(lines) == 1003
+
+
+def csv_export_peak_memory(row_count):
+    """Body size and peak traced allocation while streaming a CSV of row_count rows"""
+    def rows():
+        for index in range(row_count):
+            yield [index, f'Product number {index}', 1500.0, 'cash']
+
+    report = create_csv_report('Big Report', ['#', 'Product', 'Amount', 'Payment'], rows(), 'big.csv')
+    tracemalloc.start()
+    try:
+        body_size = sum(len(chunk) for chunk in report.chunks)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return body_size, peak
+
+
+def test_csv_report_memory_stays_flat_as_rows_grow(app):
+    small_body, small_peak = csv_export_peak_memory(10000)
+    large_body, large_peak = csv_export_peak_memory(100000)
+
+    assert large_body > 9 * small_body
+    # Ten times the rows, about the same peak: one chunk in flight at a time
+    assert large_peak < small_peak * 1.5, f'10k rows peak {small_peak}, 100k rows peak {large_peak}'
+    assert large_peak < 1024 * 1024
+
+
+def test_export_artifacts_are_written_without_a_request(app, make_product, checkout, login):
+    _, variant_id = make_product('Artifact Rum')
+    checkout(login('admin'), variant_id, 2, date(2023, 11, 7))
+    csv_path = os.path.join(app.config['EXPORT_ARTIFACT_DIR'], 'direct.csv')
+    excel_path = os.path.join(app.config['EXPORT_ARTIFACT_DIR'], 'direct.xlsx')
+    os.makedirs(app.config['EXPORT_ARTIFACT_DIR'], exist_ok=True)
+
+    with app.app_context():
+        assert not has_request_context()
+        admin_id = User.query.filter_by(role='admin').first().id
+        csv_name = write_export_artifact('sales', date(2023, 11, 1), date(2023, 11, 30), 'csv', admin_id, csv_path)
+        excel_name = write_export_artifact('full', date(2023, 11, 1), date(2023, 11, 30), 'excel', admin_id,
+                                           excel_path)
+
+    assert csv_name == 'sales_report_2023-11-01_2023-11-30.csv'
+    with open(csv_path, newline='', encoding='utf-8') as artifact:
+        rows = list(csv.reader(artifact))
+    assert [(row[1], row[3]) for row in rows[3:]] == [('Artifact Rum', '2.0')]
+
+    assert excel_name == 'full_report_2023-11-01_2023-11-30.xlsx'
+    sales = openpyxl.load_workbook(excel_path)['Sales']
+    assert [(row[1].value, row[3].value) for row in sales.iter_rows(min_row=2)] == [('Artifact Rum', 2)]
+
+
+def test_full_report_in_csv_is_refused(app, login):
+    response = login('admin').get('/reports/export/full?format=csv')
+
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/reports')
+
+
+def wait_for_job(client, status_url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(status_url).get_json()['job']
+        if job['status'] not in ('queued', 'running') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_export_job_builds_a_downloadable_file_once(app, login, make_product, checkout):
+    _, variant_id = make_product('Queued Vodka')
+    client = login('admin')
+    checkout(client, variant_id, 3, date(2023, 10, 6))
+    params = {'format': 'csv', 'start_date': '2023-10-01', 'end_date': '2023-10-31'}
+
+    submitted = client.post('/reports/export/sales/jobs', data=params)
+    assert submitted.status_code == 202
+    job = wait_for_job(client, submitted.get_json()['job']['status_url'])
+
+    assert job['status'] == 'ready'
+    download = client.get(job['download_url'])
+    assert download.status_code == 200
+    assert download.headers['Content-Disposition'] == 'attachment; filename=sales_report_2023-10-01_2023-10-31.csv'
+    rows = list(csv.reader(StringIO(download.get_data(as_text=True))))
+    assert [(row[1], row[3]) for row in rows[3:]] == [('Queued Vodka', '3.0')]
+
+    # The same export is handed back instead of being built again
+    again = client.post('/reports/export/sales/jobs', data=params)
+    assert again.status_code == 200
+    assert again.get_json()['created'] is False
+    assert again.get_json()['job']['id'] == job['id']
+
+    # Attendants only see their own data, so they cannot reach the manager's file
+    assert login('attendant').get(job['status_url']).status_code == 404
+
+
+def test_export_job_rejects_unknown_reports_and_formats(app, login):
+    client = login('admin')
+
+    assert client.post('/reports/export/stock/jobs').status_code == 400
+    assert client.post('/reports/export/sales/jobs', data={'format': 'pdf'}).status_code == 400
+    assert client.post('/reports/export/full/jobs', data={'format': 'csv'}).status_code == 400
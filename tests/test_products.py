@@ -0,0 +1,88 @@
+from datetime import date
+
+from app import get_active_variants_by_product
+from models import db, Category, DailyStock, Product, ProductVariant, Size
+
+
+def make_listing(app, make_product, category_name, count):
+    product_ids = [make_product(f'{category_name} {index:02d}', category_name=category_name)[0]
+                   for index in range(count)]
+    with app.app_context():
+        # A second, inactive-size variant must not show up in the listing
+        shot = Size(name=f'{category_name} Shot', sort_order=9, is_active=False)
+        db.session.add(shot)
+        db.session.flush()
+        db.session.add(ProductVariant(product_id=product_ids[0], size_id=shot.id,
+                                      selling_price=100, conversion_factor=0.04))
+        db.session.commit()
+        category_id = Category.query.filter_by(name=category_name).first().id
+    return category_id, product_ids
+
+
+def test_products_listing_is_paginated(app, login, make_product):
+    category_id, _ = make_listing(app, make_product, 'Paged Gin', 12)
+    client = login('admin')
+
+    first = client.get(f'/products?category_id={category_id}&per_page=5')
+    last = client.get(f'/products?category_id={category_id}&per_page=5&page=3')
+
+    assert first.status_code == 200
+    body = first.get_data(as_text=True)
+    assert 'Paged Gin 00' in body and 'Paged Gin 04' in body
+    assert 'Paged Gin 05' not in body
+    assert 'Total Products: <span id="total-products">12</span>' in body
+
+    body = last.get_data(as_text=True)
+    assert 'Paged Gin 10' in body and 'Paged Gin 11' in body
+    assert 'Paged Gin 09' not in body
+
+
+def test_products_search_reaches_other_pages(app, login, make_product):
+    category_id, _ = make_listing(app, make_product, 'Searched Rum', 8)
+    client = login('admin')
+
+    body = client.get(f'/products?category_id={category_id}&per_page=5&q=Rum 07').get_data(as_text=True)
+
+    assert 'Searched Rum 07' in body
+    assert 'Searched Rum 00' not in body
+
+
+def test_products_listing_query_count_does_not_grow_with_page_size(app, login, make_product, count_statements):
+    category_id, _ = make_listing(app, make_product, 'Counted Vodka', 30)
+    client = login('admin')
+    client.get('/products')  # warm the per-process caches
+
+    with count_statements() as small_page:
+        client.get(f'/products?category_id={category_id}&per_page=3')
+    with count_statements() as full_page:
+        client.get(f'/products?category_id={category_id}&per_page=30')
+
+    # user, page count, page rows, variants for the page, categories
+    assert len(small_page) == 5
+    assert len(full_page) == len(small_page)
+
+
+def test_active_variants_by_product_matches_per_product_lookup(app, make_product):
+    _, product_ids = make_listing(app, make_product, 'Batched Whisky', 3)
+
+    with app.app_context():
+        batched = get_active_variants_by_product(product_ids)
+        for product_id in product_ids:
+            expected = db.session.get(Product, product_id).get_active_variants()
+            assert [variant.id for variant in batched[product_id]] == [variant.id for variant in expected]
+        assert len(batched[product_ids[0]]) == 1
+        assert get_active_variants_by_product([]) == {}
+
+
+def test_delete_product_removes_its_stock_records(app, login, make_product):
+    product_id, _ = make_product('Deleted Brandy')
+    with app.app_context():
+        db.session.add(DailyStock(product_id=product_id, date=date.today(), opening_stock=100, closing_stock=100))
+        db.session.commit()
+
+    response = login('admin').post(f'/delete_product/{product_id}')
+
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(Product, product_id) is None
+        assert DailyStock.query.filter_by(product_id=product_id).count() == 0
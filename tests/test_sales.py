@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from models import db, DailyStock, Product, ProductVariant, Sale
+
+
+def stock_chain(app, product_id):
+    with app.app_context():
+        rows = DailyStock.query.filter_by(product_id=product_id).order_by(DailyStock.date).all()
+        return [(row.date, row.opening_stock, row.sales_quantity, row.closing_stock) for row in rows]
+
+
+def assert_chain_is_continuous(chain):
+    for previous, row in zip(chain, chain[1:]):
+        assert row[1] == previous[3], f'{row[0]} opens at {row[1]}, {previous[0]} closed at {previous[3]}'
+        assert row[3] == row[1] - row[2]
+
+
+def test_concurrent_checkouts_never_lose_or_oversell_stock(app, login, make_product):
+    product_id, variant_id = make_product('Contended Lager', current_stock=40)
+    tills, baskets_per_till = 12, 5
+    clients = [login('attendant') for _ in range(tills)]
+
+    def buy(client):
+        return [client.post('/checkout', json={
+            'sale_date': date.today().isoformat(),
+            'lines': [{'variant_id': variant_id, 'quantity': 1, 'unit_price': 1500}],
+            'cash_amount': 1500
+        }).status_code for _ in range(baskets_per_till)]
+
+    with ThreadPoolExecutor(max_workers=tills) as executor:
+        statuses = [status for till in executor.map(buy, clients) for status in till]
+
+    # Every basket either got stock or was refused; none failed on a lock
+    assert sorted(set(statuses)) == [200, 409]
+    assert statuses.count(200) == 40
+    with app.app_context():
+        units_sold = db.session.query(db.func.sum(Sale.quantity)).join(ProductVariant) \
+            .filter(ProductVariant.product_id == product_id).scalar()
+        assert units_sold == 40
+        assert db.session.get(Product, product_id).current_stock == 0
+        assert DailyStock.query.filter_by(product_id=product_id, date=date.today()).one().closing_stock == 0
+
+
+def test_first_sale_of_the_day_opens_at_the_stock_before_it(app, login, make_product, checkout):
+    product_id, variant_id = make_product('Opening Cider', current_stock=30)
+
+    checkout(login('admin'), variant_id, 4, date.today())
+
+    assert stock_chain(app, product_id) == [(date.today(), 30, 4, 26)]
+    with app.app_context():
+        assert db.session.get(Product, product_id).current_stock == 26
+
+
+def test_backdated_add_sale_rolls_later_days_forward(app, login, make_product, checkout):
+    product_id, variant_id = make_product('Backdated Sherry', current_stock=100)
+    client = login('admin')
+    first_day = date.today() - timedelta(days=3)
+    checkout(client, variant_id, 1, first_day)
+    checkout(client, variant_id, 1, first_day + timedelta(days=1))
+
+    response = client.post('/add_sale', data={
+        'variant_id': variant_id,
+        'quantity': 5,
+        'unit_price': 1500,
+        'cash_amount': 7500,
+        'sale_date': first_day.isoformat()
+    })
+
+    assert response.status_code == 302
+    chain = stock_chain(app, product_id)
+    assert [row[0] for row in chain] == [first_day, first_day + timedelta(days=1)]
+    assert chain[1][1] == chain[0][3] == chain[0][1] - 6
+    assert_chain_is_continuous(chain)
+
+
+def test_backdated_checkout_rolls_later_days_forward(app, login, make_product, checkout):
+    product_id, variant_id = make_product('Backdated Port', current_stock=100)
+    client = login('admin')
+    first_day = date.today() - timedelta(days=5)
+    for offset in range(3):
+        checkout(client, variant_id, 2, first_day + timedelta(days=offset))
+
+    checkout(client, variant_id, 4, first_day)
+
+    chain = stock_chain(app, product_id)
+    assert len(chain) == 3
+    assert chain[0][2] == 6
+    assert_chain_is_continuous(chain)
+    with app.app_context():
+        assert db.session.get(Product, product_id).current_stock == 100 - 10
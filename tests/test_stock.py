@@ -0,0 +1,96 @@
+from datetime import date
+
+from app import find_stock_ledger_drift, stock_ledger_days
+from models import db, Category, DailyStock, Product, ProductVariant, Sale, Size
+
+
+def add_purchase(client, product_id, quantity, purchase_date, unit_cost=1000):
+    response = client.post('/add_stock_purchase', data={
+        'product_id': product_id,
+        'quantity': quantity,
+        'unit_cost': unit_cost,
+        'purchase_date': purchase_date.isoformat()
+    })
+    assert response.status_code == 302
+
+
+def test_first_purchase_of_the_day_is_added_once(app, login, make_product):
+    product_id, _ = make_product('Purchased Amarula', current_stock=10)
+
+    add_purchase(login('admin'), product_id, 5, date.today())
+
+    with app.app_context():
+        daily_stock = DailyStock.query.filter_by(product_id=product_id, date=date.today()).one()
+        assert (daily_stock.opening_stock, daily_stock.additions, daily_stock.closing_stock) == (10, 5, 15)
+        assert db.session.get(Product, product_id).current_stock == 15
+
+
+def add_ledger_product(app, client, name, opening_stock):
+    """A product created through the form, so its opening stock is in the ledger"""
+    with app.app_context():
+        category = Category.query.filter_by(name='Ledger').first()
+        if category is None:
+            category = Category(name='Ledger')
+            db.session.add(category)
+            db.session.commit()
+        category_id = category.id
+
+    client.post('/add_product', data={
+        'name': name,
+        'category_id': category_id,
+        'base_buying_price': 1000,
+        'opening_stock': opening_stock
+    })
+
+    with app.app_context():
+        product = Product.query.filter_by(name=name).one()
+        size = Size.query.filter_by(name='Bottle').first() or Size(name='Bottle', sort_order=1)
+        db.session.add(size)
+        db.session.flush()
+        variant = ProductVariant(product_id=product.id, size_id=size.id, selling_price=1500, conversion_factor=1)
+        db.session.add(variant)
+        db.session.commit()
+        return product.id, variant.id
+
+
+def test_sale_purchase_and_edit_keep_ledger_and_daily_stock_in_step(app, login, checkout):
+    client = login('admin')
+    product_id, variant_id = add_ledger_product(app, client, 'Ledger Gin', 50)
+    today = date.today()
+
+    checkout(client, variant_id, 3, today)
+    add_purchase(client, product_id, 10, today)
+    with app.app_context():
+        sale_id = Sale.query.filter_by(variant_id=variant_id).one().id
+    client.post(f'/edit_sale/{sale_id}', data={
+        'quantity': 5,
+        'unit_price': 1500,
+        'cash_amount': 7500,
+        'sale_date': today.isoformat()
+    })
+
+    with app.app_context():
+        daily_stock = DailyStock.query.filter_by(product_id=product_id, date=today).one()
+        assert (daily_stock.opening_stock, daily_stock.additions, daily_stock.sales_quantity,
+                daily_stock.closing_stock) == (50, 10, 5, 55)
+        assert db.session.get(Product, product_id).current_stock == 55
+
+        ledger_day = stock_ledger_days(product_id, today, today)[today]
+        assert ledger_day['movements'] == {'adjustment': 50, 'sale': -8, 'reversal': 3, 'purchase': 10}
+        assert ledger_day['closing_stock'] == 55
+        assert find_stock_ledger_drift(product_id) == []
+
+
+def test_verify_stock_ledger_reports_drift(app, login):
+    product_id, _ = add_ledger_product(app, login('admin'), 'Drifted Gin', 20)
+    with app.app_context():
+        DailyStock.query.filter_by(product_id=product_id).one().closing_stock = 18
+        db.session.get(Product, product_id).current_stock = 18
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['verify-stock-ledger', '--product', str(product_id)])
+
+    assert result.exit_code == 0
+    assert f'Product {product_id} {date.today()}: closing_stock: stored 18.0 ledger 20.00' in result.output
+    assert f'Product {product_id} now: current_stock: stored 18.0 ledger 20.00' in result.output
+    assert '2 record(s) differ from the ledger' in result.output